@@ -1,123 +1,325 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from quart import Quart, request, jsonify, make_response
+from quart.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException
 import logging
-import requests
+import asyncio
+import fastjsonschema
+import httpx
+import orjson
 import os
 
-app = Flask(__name__)
 
-# Configure CORS - FIXED WITH YOUR ACTUAL FRONTEND URL
-CORS(app, origins="*")
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson's compiled encoder/decoder"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app = Quart(__name__)
+app.json = ORJSONProvider(app)
+
+# CORS for the frontend: the allowed origins are matched with one set
+# lookup and the other headers are constants
+CORS_ORIGINS = frozenset([
+    "https://chat-frontend-vtyj.onrender.com",
+    "http://localhost:8000",
+    "http://127.0.0.1:8000",
+    "http://localhost:3000"
+])
+CORS_HEADERS = {
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Max-Age": "86400"
+}
+
+
+@app.before_request
+async def answer_preflight():
+    """Answer CORS preflights before routing; after_request adds headers"""
+    if request.method == "OPTIONS":
+        return app.response_class(status=204)
+
+
+@app.after_request
+async def add_cors_headers(response):
+    origin = request.headers.get("Origin")
+    if origin in CORS_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers.update(CORS_HEADERS)
+    response.headers["Vary"] = "Origin"
+    return response
+
 
 # Database server configuration - FIXED WITH YOUR ACTUAL DATABASE URL
 DB_SERVER = os.environ.get('DATABASE_SERVICE_URL',
                            'https://chat-database-service.onrender.com')
 
+# Shared async client: every forward to the database server reuses the same
+# keep-alive connections instead of blocking a worker thread per request.
+# Connect quickly (and retry failed connects) so a hung database server
+# frees pool slots instead of piling up waiting forwards. HTTP/2 is
+# negotiated via ALPN with the TLS terminator in front of the database
+# service, so concurrent forwards share a few multiplexed connections and
+# every idle one is kept alive.
+client = httpx.AsyncClient(
+    base_url=DB_SERVER,
+    timeout=httpx.Timeout(5.0, connect=1.0),
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=50,
+                            max_keepalive_connections=50),
+    ),
+)
+
+# /stream relays hold their upstream connection open for as long as the
+# browser listens, so they get their own client: open streams never take
+# connections from the forwards above. The read timeout is lifted because
+# streams idle between heartbeats; with every slot taken, a new stream
+# gets a 503 after waiting a second for one.
+STREAM_MAX_CONNECTIONS = int(os.environ.get("STREAM_MAX_CONNECTIONS", 1000))
+stream_client = httpx.AsyncClient(
+    base_url=DB_SERVER,
+    timeout=httpx.Timeout(5.0, connect=1.0, read=None, pool=1.0),
+    transport=httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=3,
+        limits=httpx.Limits(max_connections=STREAM_MAX_CONNECTIONS,
+                            max_keepalive_connections=10),
+    ),
+)
+
+# Gateway errors are retried for idempotent requests only, so a message is
+# never inserted twice.
+RETRY_STATUSES = {502, 503, 504}
+RETRY_METHODS = {"GET", "PUT", "DELETE"}
+RETRY_TOTAL = 3
+RETRY_BACKOFF = 0.1
+
+# Keyset pagination arguments passed through to /db/fetch
+PAGE_ARGS = ("after_ts", "after_id", "before_ts", "before_id", "limit")
+
+
+async def forward(method, url, **kwargs):
+    """Send a request to the database server, retrying gateway errors."""
+    if "json" in kwargs:
+        kwargs["content"] = orjson.dumps(kwargs.pop("json"))
+        kwargs["headers"] = {"Content-Type": "application/json"}
+
+    attempt = 0
+    while True:
+        response = await client.request(method, url, **kwargs)
+        if (response.status_code not in RETRY_STATUSES
+                or method not in RETRY_METHODS or attempt >= RETRY_TOTAL):
+            return response
+        await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+        attempt += 1
+
+
+async def _body():
+    """Decode the JSON request body with orjson, skipping Quart's
+    content-type check and parse cache. Undecodable bodies give None,
+    which the validators reject with a 400.
+    """
+    try:
+        return orjson.loads(await request.get_data(cache=False) or b"{}")
+    except orjson.JSONDecodeError:
+        return None
+
+
+def passthrough(response, headers=None):
+    """Return a database server JSON response to the client unparsed"""
+    return app.response_class(response.content, response.status_code,
+                              headers, mimetype="application/json")
+
+
+def compile_validator(*fields):
+    """Compile a schema check that every field is a non-empty string or a
+    non-zero integer.
+
+    Returns a function giving the 400 error message, or None when valid.
+    """
+    validate = fastjsonschema.compile({
+        "type": "object",
+        "required": list(fields),
+        "properties": {
+            field: {"type": ["string", "integer"], "minLength": 1,
+                    "not": {"enum": [0]}}
+            for field in fields
+        },
+    })
+
+    def check(data):
+        try:
+            validate(data)
+        except fastjsonschema.JsonSchemaValueException as e:
+            if not isinstance(data, dict):
+                return "Request body must be a JSON object"
+            field = next((f for f in fields if f not in data), e.path[-1])
+            if data.get(field) in (None, "", 0):
+                return f"'{field}' is required"
+            return f"'{field}' must be a string or integer"
+        return None
+
+    return check
+
+
+validate_send = compile_validator("sender_id", "receiver_id", "message_text")
+validate_edit = compile_validator("message_id", "sender_id", "message_text")
+validate_delete = compile_validator("message_id")
+
+
 # Configure logging
-logging.basicConfig(level=logging.DEBUG,
+# LOG_LEVEL=DEBUG turns on the per-request trace lines
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(),
                     format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+# httpx logs every forwarded request at INFO
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+@app.errorhandler(httpx.HTTPError)
+async def database_unavailable(e):
+    logger.exception("[API] Error connecting to database server")
+    return jsonify({"error": "Database service unavailable"}), 503
+
+
+@app.errorhandler(Exception)
+async def internal_error(e):
+    """Turn anything a route raises into a JSON 500; HTTP errors pass through"""
+    if isinstance(e, HTTPException):
+        return e
+    logger.exception("[API] Error in %s %s", request.method, request.path)
+    return jsonify({"error": "Internal Server Error"}), 500
 
 # Root route for testing
 
 
 @app.route("/")
-def root():
+async def root():
     return jsonify({"message": "Backend server is running", "status": "ok"}), 200
 
 
 @app.route("/health", methods=["GET"])
-def health_check():
+async def health_check():
     return jsonify({"status": "healthy", "service": "API Server"}), 200
 
 
 @app.route("/message", methods=["POST"])
-def send_message():
-    try:
-        data = request.get_json(force=True)
-        logging.info("[API] Received new message request")
+async def send_message():
+    data = await _body()
+    logger.debug("[API] Received new message request")
 
-        # Validate required fields
-        required_fields = ["sender_id", "receiver_id", "message_text"]
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({"error": f"'{field}' is required"}), 400
+    # Validate required fields
+    error = validate_send(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-        # Forward request to database server
-        response = requests.post(f"{DB_SERVER}/db/insert", json=data)
-        return jsonify(response.json()), response.status_code
-
-    except requests.RequestException as e:
-        logging.exception("[API] Error connecting to database server")
-        return jsonify({"error": "Database service unavailable"}), 503
-    except Exception as e:
-        logging.exception("[API] Error in POST /message")
-        return jsonify({"error": "Internal Server Error"}), 500
+    # Forward request to database server
+    response = await forward("POST", "/db/insert", json=data)
+    return passthrough(response)
 
 
 @app.route("/messages", methods=["GET"])
-def get_messages():
-    try:
-        sender_id = request.args.get("sender_id")
-        receiver_id = request.args.get("receiver_id")
+async def get_messages():
+    sender_id = request.args.get("sender_id")
+    receiver_id = request.args.get("receiver_id")
 
-        if not sender_id or not receiver_id:
-            return jsonify({"error": "sender_id and receiver_id are required"}), 400
+    if not sender_id or not receiver_id:
+        return jsonify({"error": "sender_id and receiver_id are required"}), 400
 
-        # Forward request to database server
-        response = requests.get(
-            f"{DB_SERVER}/db/fetch",
-            params={"sender_id": sender_id, "receiver_id": receiver_id}
-        )
-        return jsonify(response.json()), response.status_code
+    # Forward request (and the optional page cursor) to database server
+    params = {"sender_id": sender_id, "receiver_id": receiver_id}
+    for key in PAGE_ARGS:
+        if request.args.get(key):
+            params[key] = request.args[key]
 
-    except requests.RequestException as e:
-        logging.exception("[API] Error connecting to database server")
-        return jsonify({"error": "Database service unavailable"}), 503
-    except Exception as e:
-        logging.exception("[API] Error in GET /messages")
-        return jsonify({"error": "Internal Server Error"}), 500
+    # Pass the browser's ETag through so unchanged polls come back as 304
+    headers = {}
+    if request.headers.get("If-None-Match"):
+        headers["If-None-Match"] = request.headers["If-None-Match"]
 
+    response = await forward("GET", "/db/fetch", params=params, headers=headers)
+    cache_headers = {key: response.headers[key]
+                     for key in ("ETag", "Cache-Control") if key in response.headers}
+    if response.status_code == 304:
+        return "", 304, cache_headers
+    return passthrough(response, cache_headers)
 
-@app.route("/edit_message", methods=["POST"])
-def edit_message():
-    try:
-        data = request.get_json(force=True)
-        required_fields = ["message_id", "sender_id", "message_text"]
 
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({"error": f"'{field}' is required"}), 400
+@app.route("/stream", methods=["GET"])
+async def stream_messages():
+    sender_id = request.args.get("sender_id")
+    receiver_id = request.args.get("receiver_id")
+
+    if not sender_id or not receiver_id:
+        return jsonify({"error": "sender_id and receiver_id are required"}), 400
+
+    # Relay the database server's event stream as it arrives
+    upstream = await stream_client.send(stream_client.build_request(
+        "GET", "/db/stream",
+        params={"sender_id": sender_id, "receiver_id": receiver_id}), stream=True)
+
+    if upstream.status_code != 200:
+        await upstream.aread()
+        await upstream.aclose()
+        return passthrough(upstream)
+
+    async def relay():
+        try:
+            async for chunk in upstream.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+    response = await make_response(relay(), 200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    response.timeout = None
+    return response
 
-        # Forward request to database server
-        response = requests.put(f"{DB_SERVER}/db/update", json=data)
-        return jsonify(response.json()), response.status_code
 
-    except requests.RequestException as e:
-        logging.exception("[API] Error connecting to database server")
-        return jsonify({"error": "Database service unavailable"}), 503
-    except Exception as e:
-        logging.exception("[API] Error in POST /edit_message")
-        return jsonify({"error": "Internal Server Error"}), 500
+@app.route("/edit_message", methods=["POST"])
+async def edit_message():
+    data = await _body()
+    error = validate_edit(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Forward request to database server
+    response = await forward("PUT", "/db/update", json=data)
+    return passthrough(response)
 
 
 @app.route("/delete_message", methods=["POST"])
-def delete_message():
-    try:
-        data = request.get_json(force=True)
-        if "message_id" not in data or not data["message_id"]:
-            return jsonify({"error": "'message_id' is required"}), 400
+async def delete_message():
+    data = await _body()
+    error = validate_delete(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-        response = requests.delete(f"{DB_SERVER}/db/delete", json=data)
-        return jsonify(response.json()), response.status_code
-    except requests.RequestException as e:
-        logging.exception("[API] Error connecting to database server")
-        return jsonify({"error": "Database service unavailable"}), 503
-    except Exception as e:
-        logging.exception("[API] Error in POST /delete_message")
-        return jsonify({"error": "Internal Server Error"}), 500
+    response = await forward("DELETE", "/db/delete", json=data)
+    return passthrough(response)
 
 
+@app.after_serving
+async def close_client():
+    await client.aclose()
+    await stream_client.aclose()
+
+
+# Production runs under gunicorn (see Procfile / gunicorn.conf.py).
 if __name__ == "__main__":
+    import uvicorn
+
     port = int(os.environ.get('PORT', 5001))
-    print(f"Starting API Server on port {port}...")
-    app.run(debug=True, host='0.0.0.0', port=port, use_reloader=False)
+    logger.info("[API] Starting API Server on port %s", port)
+    uvicorn.run("app:app", host='0.0.0.0', port=port,
+                workers=int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1)),
+                loop="uvloop", http="httptools")
@@ -0,0 +1,9 @@
+import multiprocessing
+import os
+
+# Run with: gunicorn app:app (this file is picked up automatically).
+# The app is ASGI, so workers are uvicorn event loops rather than gevent.
+bind = f"0.0.0.0:{os.environ.get('PORT', 5001)}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY",
+                             multiprocessing.cpu_count() * 2 + 1))
@@ -1,14 +1,168 @@
 import sqlite3
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from typing import List, Dict, Any, Union
 
 DB_PATH = "messages.db"
 
+# Connections kept open for reuse, so each one's page cache stays warm
+POOL_SIZE = min(32, (os.cpu_count() or 1) * 2)
+
+# Seconds between PRAGMA optimize runs (refreshes planner statistics)
+OPTIMIZE_INTERVAL = 60 * 60
+
+FETCH_DEFAULT_LIMIT = 100
+FETCH_MAX_LIMIT = 500
+
+# Hot-path statements. Each connection caches its compiled statements by
+# SQL text, so these are parsed once per connection and reused.
+SQL_INSERT_MESSAGE = """
+    INSERT INTO messages (sender_id, receiver_id, message_text)
+    VALUES (?, ?, ?)
+"""
+
+# Messages where sender and receiver match in either direction, one page
+# after the (after_ts, after_id) cursor
+SQL_FETCH_MESSAGES = """
+    SELECT message_id, sender_id, receiver_id, message_text, timestamp
+    FROM messages
+    WHERE min(sender_id, receiver_id) = min(?, ?)
+      AND max(sender_id, receiver_id) = max(?, ?)
+      AND (timestamp, message_id) > (?, ?)
+    ORDER BY timestamp ASC, message_id ASC
+    LIMIT ?
+"""
+
 # Configure logging
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
+logger = logging.getLogger(__name__)
+
+SCHEMA_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        message_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sender_id TEXT NOT NULL,
+        receiver_id TEXT NOT NULL,
+        message_text TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Index the unordered sender/receiver pair so fetches are a range
+    # scan in timestamp order instead of a scan + sort
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_pair_ts ON messages (
+        min(sender_id, receiver_id),
+        max(sender_id, receiver_id),
+        timestamp,
+        message_id
+    )
+    """,
+]
+
+_pool = None
+_init_lock = threading.Lock()
+_next_optimize = 0.0
+
+
+def _connect():
+    """Open a connection with the per-connection PRAGMAs applied"""
+    # Autocommit: each INSERT is its own short transaction. The busy
+    # timeout makes a writer wait for the lock instead of failing.
+    conn = sqlite3.connect(DB_PATH, timeout=5.0, check_same_thread=False,
+                           isolation_level=None, cached_statements=256)
+
+    # WAL lets readers run alongside the writer; NORMAL skips the
+    # fsync on every commit (only checkpoints are synced)
+    journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+    if journal_mode != "wal":
+        logger.warning("[DB] SQLite is in %s journal mode, not WAL", journal_mode)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    # Temp tables/sorts in memory, a 64 MB page cache and reads served
+    # from a 256 MB memory map instead of read() calls
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA mmap_size=268435456")
+    # Checkpoint the WAL back into the database every 1000 pages
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    return conn
+
+
+def _close_pool(pool):
+    while True:
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            break
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+
+def _init_once():
+    """Create the schema and open the connection pool, once per process"""
+    global _pool, _next_optimize
+    if _pool is not None:
+        return _pool
+
+    with _init_lock:
+        if _pool is None:
+            # _connect() has already switched to WAL, so readers in other
+            # processes are not blocked while an index is being built
+            conn = _connect()
+
+            # One write transaction for all DDL, taking the lock up front
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in SCHEMA_STATEMENTS:
+                    started = time.perf_counter()
+                    conn.execute(statement)
+                    logger.debug("[DB] %s took %.1f ms", statement.split("(")[0].strip(),
+                                 (time.perf_counter() - started) * 1000)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            # Refresh planner statistics for any table or index that needs
+            # them, with a bounded sample so this stays cheap on large files
+            conn.execute("PRAGMA analysis_limit=400")
+            conn.execute("PRAGMA optimize=0x10002")
+            _next_optimize = time.monotonic() + OPTIMIZE_INTERVAL
+
+            pool = queue.Queue()
+            pool.put(conn)
+            for _ in range(POOL_SIZE - 1):
+                pool.put(_connect())
+            atexit.register(_close_pool, pool)
+            _pool = pool
+    return _pool
+
+
+@contextmanager
+def get_conn():
+    """Borrow a pooled connection for the duration of the block.
+
+    Every OPTIMIZE_INTERVAL seconds one borrower also runs PRAGMA optimize
+    before handing the connection back.
+    """
+    global _next_optimize
+    pool = _init_once()
+    conn = pool.get()
+    try:
+        yield conn
+        now = time.monotonic()
+        if now >= _next_optimize:
+            _next_optimize = now + OPTIMIZE_INTERVAL
+            conn.execute("PRAGMA optimize")
+    finally:
+        pool.put(conn)
 
 
 def insert_message(data):
@@ -20,33 +174,18 @@ def insert_message(data):
         return {"ok": False, "error": f"Missing fields: {', '.join(missing_keys)}"}
 
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with get_conn() as conn:
             cursor = conn.cursor()
 
-            # Ensure table exists
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    message_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender_id TEXT NOT NULL,
-                    receiver_id TEXT NOT NULL,
-                    message_text TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-
             # Insert data
-            cursor.execute("""
-                INSERT INTO messages (sender_id, receiver_id, message_text)
-                VALUES (?, ?, ?)
-            """, (
+            cursor.execute(SQL_INSERT_MESSAGE, (
                 str(data["sender_id"]),
                 str(data["receiver_id"]),
                 str(data["message_text"])
             ))
 
-            conn.commit()
-            message_id = cursor.lastrowid
-            return {"message_id": message_id, "status": "success"}
+        message_id = cursor.lastrowid
+        return {"message_id": message_id, "status": "success"}
 
     except sqlite3.IntegrityError as e:
         return {"error": str(e)}, 400
@@ -55,37 +194,41 @@ def insert_message(data):
         return {"error": "Database error occurred"}, 500
 
 
-def fetch_messages(sender_id, receiver_id):
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
+def fetch_messages(sender_id, receiver_id, after_ts=None, after_id=0,
+                   limit=FETCH_DEFAULT_LIMIT):
+    limit = max(1, min(int(limit), FETCH_MAX_LIMIT))
 
-            # Select messages where sender and receiver match in either direction
-            cursor.execute("""
-                SELECT message_id, sender_id, receiver_id, message_text, timestamp
-                FROM messages
-                WHERE (sender_id = ? AND receiver_id = ?)
-                   OR (sender_id = ? AND receiver_id = ?)
-                ORDER BY timestamp ASC
-            """, (sender_id, receiver_id, receiver_id, sender_id))
-
-            rows = cursor.fetchall()
-
-            messages = [
-                {
-                    "message_id": row[0],
-                    "sender_id": row[1],
-                    "receiver_id": row[2],
-                    "message_text": row[3],
-                    "timestamp": row[4]
-                }
-                for row in rows
-            ]
-
-            if not messages:
-                return {"error": "No messages found"}, 404
-
-            return {"messages": messages, "status": "success"}, 200
+    try:
+        with get_conn() as conn:
+            rows = conn.execute(SQL_FETCH_MESSAGES, (
+                sender_id, receiver_id, sender_id, receiver_id,
+                after_ts or "", after_id, limit + 1)).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        messages = [
+            {
+                "message_id": row[0],
+                "sender_id": row[1],
+                "receiver_id": row[2],
+                "message_text": row[3],
+                "timestamp": row[4]
+            }
+            for row in rows
+        ]
+
+        if not messages:
+            return {"error": "No messages found"}, 404
+
+        last = messages[-1]
+        return {
+            "messages": messages,
+            "status": "success",
+            "has_more": has_more,
+            "next_after_ts": last["timestamp"],
+            "next_after_id": last["message_id"]
+        }, 200
 
     except Exception as e:
         return {"error": "Database error occurred"}, 500
@@ -1,61 +1,346 @@
 from flask import Flask, request, jsonify
-from flask_cors import CORS
+from flask.json.provider import JSONProvider
+from werkzeug.exceptions import HTTPException
 import logging
+import fastjsonschema
+import hmac
+import orjson
 import os
+import queue
+import select
+import threading
+import time
 import psycopg2
-from datetime import datetime
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
+import redis
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import urllib.parse as urlparse
 
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider backed by orjson's compiled encoder/decoder"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within POOL_TIMEOUT seconds"""
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
-# FIXED: Add proper CORS for your frontend
-CORS(app, origins=[
+# CORS for your frontend: the allowed origins are matched with one set
+# lookup and the other headers are constants
+CORS_ORIGINS = frozenset([
     "https://chat-frontend-vtyj.onrender.com",
     "https://chat-backend-service-fm6k.onrender.com",
     "http://localhost:8000",
     "http://127.0.0.1:8000",
     "http://localhost:3000"
 ])
+CORS_HEADERS = {
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Max-Age": "86400"
+}
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                    format="%(asctime)s [%(levelname)s] %(message)s")
 
-# Database configuration - using Render PostgreSQL
+@app.before_request
+def answer_preflight():
+    """Answer CORS preflights before routing; after_request adds headers"""
+    if request.method == "OPTIONS":
+        return app.response_class(status=204)
 
 
-def get_db_connection():
-    database_url = os.environ.get('DATABASE_URL')
+@app.after_request
+def add_cors_headers(response):
+    origin = request.headers.get("Origin")
+    if origin in CORS_ORIGINS:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers.update(CORS_HEADERS)
+    response.headers["Vary"] = "Origin"
+    return response
 
-    print(f"🔍 DATABASE_URL: {database_url}")
 
-    if database_url:
-        try:
-            # Fix the URL format if needed
-            if database_url.startswith('postgresql://'):
-                # URL is already correct
-                fixed_url = database_url
-            elif database_url.startswith('postgres://'):
-                # Convert postgres:// to postgresql://
-                fixed_url = database_url.replace(
-                    'postgres://', 'postgresql://', 1)
-            else:
-                fixed_url = database_url
-
-            print(f"🔗 Connecting to PostgreSQL: {fixed_url}")
-
-            # Connect using the URL directly
-            conn = psycopg2.connect(fixed_url, sslmode='require')
-            print("✅ Successfully connected to PostgreSQL")
-            return conn
+# Configure logging
+# LOG_LEVEL=DEBUG turns on the per-request trace lines
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+                    format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
 
-        except Exception as e:
-            print(f"❌ PostgreSQL connection failed: {e}")
-            # Don't fall back to SQLite in production - raise the error
-            raise Exception(f"PostgreSQL connection failed: {str(e)}")
+# Database configuration - using Render PostgreSQL
+
+# Each worker holds up to POOL_MAX_CONN connections plus one LISTEN
+# connection, so workers * (POOL_MAX_CONN + 1) must stay under Postgres'
+# max_connections. Requests wait up to POOL_TIMEOUT seconds for a free
+# connection and get a 503 after that.
+POOL_MIN_CONN = 2
+POOL_MAX_CONN = int(os.environ.get("POOL_MAX_CONN", 20))
+POOL_TIMEOUT = float(os.environ.get("POOL_TIMEOUT", 5))
+
+# bcrypt work factor used by pgcrypto's gen_salt('bf', ...). Each hash
+# records its own cost, so raising this only affects new passwords.
+PASSWORD_HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", 12))
+
+# Inserts are grouped into one multi-row INSERT per batch: up to
+# INSERT_BATCH_SIZE rows or INSERT_BATCH_WAIT seconds, whichever comes first.
+# At most INSERT_QUEUE_SIZE messages wait; beyond that inserts get a 503.
+INSERT_BATCH_SIZE = 500
+INSERT_BATCH_WAIT = 0.005
+INSERT_QUEUE_SIZE = 10_000
+INSERT_TIMEOUT = 10
+
+FETCH_DEFAULT_LIMIT = 100
+FETCH_MAX_LIMIT = 500
+# message_id is a SERIAL (int4) column
+MAX_MESSAGE_ID = 2**31 - 1
+# Batches from different workers can commit out of timestamp order, so a
+# row may land behind a cursor the client already holds. Forward fetches
+# also return the messages from this many seconds before the cursor; the
+# client drops the ones it already shows by message_id.
+FETCH_OVERLAP_SECONDS = 5
+
+# Optional Redis cache of each conversation's newest messages; polls with a
+# cursor are answered from it instead of Postgres. Disabled without REDIS_URL.
+REDIS_URL = os.environ.get("REDIS_URL")
+CACHE_MAX_MESSAGES = 1000
+CACHE_TTL = 24 * 60 * 60
+
+# Inserts NOTIFY this channel with the conversation's pair_key; open
+# /db/stream responses wake up and tell their client to fetch. Streams
+# send a comment line every STREAM_HEARTBEAT seconds when idle.
+NOTIFY_CHANNEL = "new_messages"
+STREAM_HEARTBEAT = 15
+
+_redis = (redis.Redis.from_url(REDIS_URL, decode_responses=True,
+                               max_connections=64)
+          if REDIS_URL else None)
+
+_pool = None
+_pool_lock = threading.Lock()
+# getconn() raises as soon as the pool is empty; callers queue on this
+# semaphore instead (cooperative once wsgi.py has monkey-patched threading)
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+
+
+def pair_key_sql(a, b):
+    """SQL for the canonical key of an unordered sender/receiver pair.
+
+    The length prefix keeps keys unambiguous whatever characters the ids
+    contain; LEAST/GREATEST order the pair by the database's collation.
+    """
+    return (f"length(LEAST({a}, {b}))::text || ':' || "
+            f"LEAST({a}, {b}) || GREATEST({a}, {b})")
+
+
+# Every insert, edit and delete bumps its conversation's version in the
+# same transaction; /db/fetch builds its ETag from it. Takes the pair_key
+# column of the SELECT that follows it.
+BUMP_VERSIONS_SQL = """
+    INSERT INTO conversation_versions (pair_key)
+    SELECT pair_key FROM {source}
+    ON CONFLICT (pair_key) DO UPDATE
+    SET version = conversation_versions.version + 1
+"""
+
+
+# Hot statements are parsed and planned once per connection, then run with
+# EXECUTE <name>(...). Inserts are not listed: they go through the batch
+# writer's multi-row INSERT, whose row count varies per call.
+PREPARED_STATEMENTS = [
+    # The whole /db/fetch payload is built as JSON text in Postgres, so no
+    # Python objects are made per row. Reads one row past the page ($5) to
+    # set has_more. Rows in the $6-second overlap behind the cursor come
+    # first (n = 0); they do not move the cursor or count toward the page.
+    """
+    PREPARE sel_msgs(text, text, timestamp, integer, integer, integer) AS
+    WITH page AS (
+        SELECT message_id, sender_id, receiver_id, message_text, timestamp,
+               row_number() OVER (ORDER BY timestamp, message_id) AS n
+        FROM messages
+        WHERE pair_key = """ + pair_key_sql("$1", "$2") + """
+          AND (timestamp, message_id) > ($3, $4)
+        ORDER BY timestamp ASC, message_id ASC
+        LIMIT $5 + 1
+    ), overlap AS (
+        SELECT message_id, sender_id, receiver_id, message_text, timestamp,
+               0::bigint AS n
+        FROM messages
+        WHERE pair_key = """ + pair_key_sql("$1", "$2") + """
+          AND timestamp >= $3 - $6 * interval '1 second'
+          AND (timestamp, message_id) <= ($3, $4)
+    ), rows AS (
+        SELECT *, to_char(timestamp, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS ts
+        FROM (SELECT * FROM overlap UNION ALL SELECT * FROM page) AS fetched
+    )
+    SELECT json_build_object(
+        'messages', COALESCE(json_agg(json_build_object(
+            'message_id', message_id,
+            'sender_id', sender_id,
+            'receiver_id', receiver_id,
+            'message_text', message_text,
+            'timestamp', ts
+        ) ORDER BY timestamp, message_id) FILTER (WHERE n <= $5), '[]'),
+        'status', 'success',
+        'has_more', count(*) FILTER (WHERE n > 0) > $5,
+        'next_after_ts', COALESCE(
+            (array_agg(ts ORDER BY n DESC) FILTER (WHERE n BETWEEN 1 AND $5))[1],
+            to_char($3, 'YYYY-MM-DD"T"HH24:MI:SS.US')),
+        'next_after_id', COALESCE(
+            (array_agg(message_id ORDER BY n DESC) FILTER (WHERE n BETWEEN 1 AND $5))[1],
+            $4)
+    )::text
+    FROM rows
+    """,
+    # Older history, newest first below the (before_ts, before_id) cursor,
+    # or the newest page without one; the page itself is returned oldest
+    # first like sel_msgs, with the after cursor to poll forward from
+    """
+    PREPARE sel_older(text, text, timestamp, integer, integer) AS
+    WITH page AS (
+        SELECT message_id, sender_id, receiver_id, message_text,
+               to_char(timestamp, 'YYYY-MM-DD"T"HH24:MI:SS.US') AS ts,
+               row_number() OVER (ORDER BY timestamp DESC, message_id DESC) AS n
+        FROM messages
+        WHERE pair_key = """ + pair_key_sql("$1", "$2") + """
+          AND (timestamp, message_id) < (COALESCE($3, 'infinity'), $4)
+        ORDER BY timestamp DESC, message_id DESC
+        LIMIT $5 + 1
+    )
+    SELECT json_build_object(
+        'messages', COALESCE(json_agg(json_build_object(
+            'message_id', message_id,
+            'sender_id', sender_id,
+            'receiver_id', receiver_id,
+            'message_text', message_text,
+            'timestamp', ts
+        ) ORDER BY n DESC) FILTER (WHERE n <= $5), '[]'),
+        'status', 'success',
+        'has_more', count(*) > $5,
+        'next_before_ts', (array_agg(ts ORDER BY n DESC) FILTER (WHERE n <= $5))[1],
+        'next_before_id', (array_agg(message_id ORDER BY n DESC) FILTER (WHERE n <= $5))[1],
+        'next_after_ts', (array_agg(ts ORDER BY n) FILTER (WHERE n <= $5))[1],
+        'next_after_id', (array_agg(message_id ORDER BY n) FILTER (WHERE n <= $5))[1]
+    )::text
+    FROM page
+    """,
+    """
+    PREPARE sel_recent(text, text, integer) AS
+    SELECT message_id, sender_id, receiver_id, message_text, timestamp
+    FROM messages
+    WHERE pair_key = """ + pair_key_sql("$1", "$2") + """
+    ORDER BY timestamp DESC, message_id DESC
+    LIMIT $3
+    """,
+    """
+    PREPARE upd_msg(text, integer, text) AS
+    WITH changed AS (
+        UPDATE messages
+        SET message_text = $1
+        WHERE message_id = $2 AND sender_id = $3
+        RETURNING sender_id, receiver_id, pair_key
+    ), bumped AS (""" + BUMP_VERSIONS_SQL.format(source="changed") + """)
+    SELECT sender_id, receiver_id FROM changed
+    """,
+    """
+    PREPARE del_msg(integer, text) AS
+    WITH changed AS (
+        DELETE FROM messages
+        WHERE message_id = $1 AND sender_id = $2
+        RETURNING sender_id, receiver_id, pair_key
+    ), bumped AS (""" + BUMP_VERSIONS_SQL.format(source="changed") + """)
+    SELECT sender_id, receiver_id FROM changed
+    """,
+    """
+    PREPARE sel_version(text, text) AS
+    SELECT version FROM conversation_versions
+    WHERE pair_key = """ + pair_key_sql("$1", "$2") + """
+    """,
+]
+
+
+class PreparedConnection(psycopg2.extensions.connection):
+    """Connection that remembers whether PREPARED_STATEMENTS ran on it"""
+    prepared = False
+
+    def prepare_statements(self):
+        with self.cursor() as cursor:
+            # PREPARE is not transactional: drop whatever an earlier,
+            # partly failed attempt left behind before preparing again
+            cursor.execute("DEALLOCATE ALL")
+            for statement in PREPARED_STATEMENTS:
+                cursor.execute(statement)
+        self.commit()
+        self.prepared = True
+
+
+def get_database_url():
+    database_url = os.environ.get('DATABASE_URL')
 
-    # In production, don't fall back to SQLite
-    raise Exception("DATABASE_URL environment variable not set")
+    if not database_url:
+        # In production, don't fall back to SQLite
+        raise Exception("DATABASE_URL environment variable not set")
+
+    # Fix the URL format if needed
+    if database_url.startswith('postgres://'):
+        # Convert postgres:// to postgresql://
+        return database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+
+def get_pool():
+    """Create the connection pool on first use and return it"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                fixed_url = get_database_url()
+                logger.info("[DB] Connecting to PostgreSQL")
+                try:
+                    _pool = psycopg2.pool.ThreadedConnectionPool(
+                        POOL_MIN_CONN, POOL_MAX_CONN, dsn=fixed_url,
+                        sslmode='require', keepalives=1, keepalives_idle=30,
+                        connection_factory=PreparedConnection)
+                except Exception as e:
+                    logger.error("[DB] PostgreSQL connection failed: %s", e)
+                    raise Exception(f"PostgreSQL connection failed: {str(e)}")
+                logger.info("[DB] Connected to PostgreSQL")
+    return _pool
+
+
+@contextmanager
+def db_cursor(prepare=True):
+    """Borrow a pooled connection, yield a cursor and commit on success"""
+    pool = get_pool()
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+        raise PoolTimeout()
+    try:
+        conn = pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+    try:
+        if prepare and not conn.prepared:
+            conn.prepare_statements()
+        with conn.cursor() as cursor:
+            yield cursor
+        conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+        _pool_slots.release()
 
 # ---------------- INITIALIZE DATABASE ----------------
 
@@ -63,299 +348,874 @@ def get_db_connection():
 def init_database():
     """Initialize database tables"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Create messages table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                message_id SERIAL PRIMARY KEY,
-                sender_id TEXT NOT NULL,
-                receiver_id TEXT NOT NULL,
-                message_text TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                password TEXT NOT NULL
-            )
-        """)
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print("✅ Database tables initialized successfully")
+        # The tables may not exist yet, so skip PREPARE on this connection
+        with db_cursor(prepare=False) as cursor:
+            # crypt()/gen_salt() for password hashing
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pgcrypto")
+
+            # Create messages table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    message_id SERIAL PRIMARY KEY,
+                    sender_id TEXT NOT NULL,
+                    receiver_id TEXT NOT NULL,
+                    message_text TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Conversation lookups match the pair in either direction, so
+            # store the unordered pair as one key and walk it in timestamp
+            # order; the generated column needs nothing from the insert path
+            cursor.execute("""
+                ALTER TABLE messages ADD COLUMN IF NOT EXISTS pair_key TEXT
+                GENERATED ALWAYS AS (""" + pair_key_sql("sender_id", "receiver_id") + """) STORED
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_pair_key_ts
+                ON messages (pair_key, timestamp, message_id)
+            """)
+            # Superseded by idx_messages_pair_key_ts
+            cursor.execute("DROP INDEX IF EXISTS idx_messages_pair_ts")
+
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS conversation_versions (
+                    pair_key TEXT PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 1
+                )
+            """)
+
+            # Create users table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id TEXT PRIMARY KEY,
+                    password_hash TEXT NOT NULL
+                )
+            """)
+
+            # Hash any passwords left in the old plaintext column
+            cursor.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'users' AND column_name = 'password'
+            """)
+            if cursor.fetchone():
+                cursor.execute(
+                    "ALTER TABLE users ADD COLUMN IF NOT EXISTS password_hash TEXT")
+                cursor.execute("""
+                    UPDATE users SET password_hash = crypt(password, gen_salt('bf', %s))
+                    WHERE password_hash IS NULL
+                """, (PASSWORD_HASH_ROUNDS,))
+                cursor.execute("ALTER TABLE users DROP COLUMN password")
+                cursor.execute(
+                    "ALTER TABLE users ALTER COLUMN password_hash SET NOT NULL")
+
+            # Login reads only password_hash by user_id: carrying it in the
+            # index lets that lookup be an index-only scan
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_cover
+                ON users (user_id) INCLUDE (password_hash)
+            """)
+
+        logger.info("[DB] Database tables initialized successfully")
 
     except Exception as e:
-        print(f"❌ Error initializing database: {e}")
+        logger.error("[DB] Error initializing database: %s", e)
 
 # ---------------- PARSE REQUEST DATA ----------------
 
 
-def parse_request_data(data, required_keys):
-    missing_keys = required_keys - data.keys()
-    if missing_keys:
-        print(f"[DB] ❌ Missing required fields: {', '.join(missing_keys)}")
-        return None, f"Missing fields: {', '.join(missing_keys)}"
-
-    extracted = {key: data[key] for key in required_keys}
-    print(f"[DB] ✅ Successfully parsed request data: {extracted}")
-    return extracted, None
+def _body():
+    """Decode the JSON request body with orjson, skipping Werkzeug's
+    content-type check and parse cache. Undecodable bodies give None,
+    which the validators reject with a 400.
+    """
+    try:
+        return orjson.loads(request.get_data(cache=False) or b"{}")
+    except orjson.JSONDecodeError:
+        return None
+
+
+# Field schemas for compile_validator, matching the backend's: strings or
+# integers. Message ids arrive as numbers or, from the frontend's onclick
+# handlers, as digit strings.
+TEXT_FIELD = {"type": ["string", "integer"], "minLength": 1}
+ID_FIELD = {"type": ["integer", "string"], "pattern": "^[0-9]{1,10}$",
+            "minimum": 1, "maximum": MAX_MESSAGE_ID}
+
+
+def compile_validator(**fields):
+    """Compile a schema check that every field is present and well typed.
+
+    Returns a function giving the 400 error message, or None when valid.
+    Integer values of TEXT_FIELDs are replaced with strings so the text
+    columns and the pair key compare them as text.
+    """
+    validate = fastjsonschema.compile({
+        "type": "object",
+        "required": list(fields),
+        "properties": fields
+    })
+    text_fields = [key for key, schema in fields.items() if schema is TEXT_FIELD]
+
+    def check(data):
+        try:
+            validate(data)
+        except fastjsonschema.JsonSchemaValueException as e:
+            if not isinstance(data, dict):
+                return "Request body must be a JSON object"
+            missing_keys = [key for key in fields if key not in data]
+            if missing_keys:
+                return f"Missing fields: {', '.join(missing_keys)}"
+            return f"Invalid field: {e.path[-1]}"
+        for key in text_fields:
+            if isinstance(data[key], int):
+                data[key] = str(data[key])
+        return None
+
+    return check
+
+
+validate_credentials = compile_validator(user_id=TEXT_FIELD, password=TEXT_FIELD)
+validate_insert = compile_validator(
+    sender_id=TEXT_FIELD, receiver_id=TEXT_FIELD, message_text=TEXT_FIELD)
+validate_update = compile_validator(
+    message_id=ID_FIELD, sender_id=TEXT_FIELD, message_text=TEXT_FIELD)
+validate_delete = compile_validator(message_id=ID_FIELD, sender_id=TEXT_FIELD)
+
+
+def parse_page_args(args):
+    """Read the keyset cursor and page limit from a query.
+
+    after_ts/after_id pages forward to newer messages, before_ts/before_id
+    pages back through older ones; at most one of the two may be given.
+    Without either, the newest page is returned.
+    """
+    try:
+        after_ts = args.get("after_ts")
+        before_ts = args.get("before_ts")
+        for ts in (after_ts, before_ts):
+            # Stored and cached timestamps are naive, so offsets are refused
+            if ts and datetime.fromisoformat(ts).tzinfo is not None:
+                raise ValueError(ts)
+        after_id = int(args.get("after_id") or 0)
+        before_id = int(args.get("before_id") or MAX_MESSAGE_ID)
+        # Both are bound to integer parameters of the prepared statements
+        for message_id in (after_id, before_id):
+            if not 0 <= message_id <= MAX_MESSAGE_ID:
+                raise ValueError(message_id)
+        limit = int(args.get("limit") or FETCH_DEFAULT_LIMIT)
+    except ValueError:
+        return None, ("Invalid page cursor: after_ts/before_ts must be ISO timestamps "
+                      f"without a UTC offset, ids integers from 0 to {MAX_MESSAGE_ID} "
+                      "and limit an integer")
+
+    if after_ts and before_ts:
+        return None, "Pass either after_ts or before_ts, not both"
+
+    limit = max(1, min(limit, FETCH_MAX_LIMIT))
+    return {"after_ts": after_ts or None, "after_id": after_id,
+            "before_ts": before_ts or None, "before_id": before_id,
+            "limit": limit}, None
+
+# ---------------- ERROR HANDLERS ----------------
+
+
+@app.errorhandler(queue.Full)
+def insert_queue_full(e):
+    logger.warning("[DB] Insert queue full, rejecting message")
+    return jsonify({"error": "Too many pending messages, try again"}), 503
+
+
+@app.errorhandler(PoolTimeout)
+def pool_exhausted(e):
+    logger.warning("[DB] No free connection after %ss", POOL_TIMEOUT)
+    return jsonify({"error": "Database busy, try again"}), 503
+
+
+@app.errorhandler(Exception)
+def internal_error(e):
+    """Turn anything a route raises into a JSON 500; HTTP errors pass through"""
+    if isinstance(e, HTTPException):
+        return e
+    logger.exception("[DB] Error in %s %s", request.method, request.path)
+    return jsonify({"error": "Internal Server Error"}), 500
 
 # ---------------- REGISTER FUNCTION (PostgreSQL) ----------------
 
 
 @app.route("/db/register", methods=["POST"])
 def register_user():
-    try:
-        data = request.get_json(force=True)
-        extracted, error = parse_request_data(data, {"user_id", "password"})
-        if error:
-            return jsonify({"error": error}), 400
-
-        user_id = extracted["user_id"]
-        password = extracted["password"]
-        print(f"[DB] 📝 Attempting to register user: {user_id}")
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT user_id FROM users WHERE user_id = %s", (user_id,))
-        if cursor.fetchone():
-            print(f"[DB] ⚠️ User {user_id} already exists")
-            cursor.close()
-            conn.close()
+    data = _body()
+    error = validate_credentials(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    user_id = data["user_id"]
+    password = data["password"]
+    logger.debug("[DB] Attempting to register user: %s", user_id)
+
+    # One statement: the primary key rejects duplicates and the
+    # password is hashed in the database
+    with db_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO users (user_id, password_hash)
+            VALUES (%s, crypt(%s, gen_salt('bf', %s)))
+            ON CONFLICT (user_id) DO NOTHING
+            RETURNING user_id
+        """, (user_id, password, PASSWORD_HASH_ROUNDS))
+        if cursor.fetchone() is None:
+            logger.debug("[DB] User %s already exists", user_id)
             return jsonify({"error": "User already exists"}), 400
 
-        cursor.execute(
-            "INSERT INTO users (user_id, password) VALUES (%s, %s)", (user_id, password))
-        conn.commit()
-        cursor.close()
-        conn.close()
-
-        print(f"[DB] ✅ User {user_id} registered successfully")
-        return jsonify({"status": "success", "user_id": user_id}), 201
-
-    except Exception as e:
-        logging.exception("[DB] Error in register_user")
-        print(f"[DB] ❌ Error registering user: {e}")
-        return jsonify({"error": "Internal Server Error"}), 500
+    logger.debug("[DB] User %s registered successfully", user_id)
+    return jsonify({"status": "success", "user_id": user_id}), 201
 
 # ---------------- LOGIN FUNCTION (PostgreSQL) ----------------
 
 
 @app.route("/db/login", methods=["POST"])
 def login_user():
+    data = _body()
+    error = validate_credentials(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    user_id = data["user_id"]
+    password = data["password"]
+    logger.debug("[DB] Login attempt for user: %s", user_id)
+
+    # Hash the attempt with the stored salt in the database; no row
+    # means no user
+    with db_cursor() as cursor:
+        cursor.execute("""
+            SELECT password_hash, crypt(%s, password_hash)
+            FROM users WHERE user_id = %s
+        """, (password, user_id))
+        row = cursor.fetchone()
+
+    if not row:
+        logger.debug("[DB] User %s not found", user_id)
+        return jsonify({"user_id": False, "password": False}), 200
+
+    # Constant-time comparison so response timing leaks nothing
+    password_match = hmac.compare_digest(str(row[0]), str(row[1]))
+    logger.debug("[DB] Login check for %s: password match = %s",
+                 user_id, password_match)
+    return jsonify({"user_id": True, "password": password_match}), 200
+
+# ---------------- MESSAGE CACHE (Redis) ----------------
+
+
+def message_dict(row):
+    """Shape a (message_id, sender_id, receiver_id, text, timestamp) row"""
+    return {
+        "message_id": row[0],
+        "sender_id": row[1],
+        "receiver_id": row[2],
+        "message_text": row[3],
+        "timestamp": row[4].isoformat(timespec="microseconds") if hasattr(row[4], 'isoformat') else row[4]
+    }
+
+
+def cache_key(sender_id, receiver_id):
+    low, high = sorted((str(sender_id), str(receiver_id)))
+    return f"chat:{low}:{high}"
+
+
+# Appends one message to a conversation's cached list. The list must stay
+# in (timestamp, message_id) order, and its version key records the
+# conversation_versions value it is complete up to. A message is pushed
+# only when it continues both: a version gap (a batch from another worker
+# not appended yet) or a message older than the list's newest drops the
+# list instead, and the next read refills it from Postgres.
+# KEYS: list, version key. ARGV: message JSON, timestamp, id, max length,
+# version, TTL.
+CACHE_PUSH_SCRIPT = """
+local newest = redis.call('LINDEX', KEYS[1], -1)
+if not newest then
+    return 0
+end
+local cached = tonumber(redis.call('GET', KEYS[2]) or -1)
+local version = tonumber(ARGV[5])
+newest = cjson.decode(newest)
+local id = tonumber(ARGV[3])
+if (cached ~= version - 1 and cached ~= version) or newest.timestamp > ARGV[2] or
+        (newest.timestamp == ARGV[2] and newest.message_id > id) then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return 0
+end
+if newest.message_id ~= id then
+    redis.call('RPUSH', KEYS[1], ARGV[1])
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[4]), -1)
+end
+redis.call('SET', KEYS[2], version, 'EX', ARGV[6])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+return 1
+"""
+_cache_push = _redis.register_script(CACHE_PUSH_SCRIPT) if _redis else None
+
+
+def cache_append(entries):
+    """Push newly inserted messages onto their conversations' cached lists.
+
+    entries are (row, version) pairs, version being the conversation's
+    conversation_versions value after the row's transaction. Only lists
+    that already exist are extended. If Redis fails part way, the touched
+    lists are dropped rather than left missing messages.
+    """
+    if _redis is None:
+        return
+    keys = set()
     try:
-        data = request.get_json(force=True)
-        extracted, error = parse_request_data(data, {"user_id", "password"})
-        if error:
-            return jsonify({"error": error}), 400
-
-        user_id = extracted["user_id"]
-        password = extracted["password"]
-        print(f"[DB] 🔑 Login attempt for user: {user_id}")
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT password FROM users WHERE user_id = %s", (user_id,))
+        with _redis.pipeline(transaction=False) as pipe:
+            for row, version in entries:
+                key = cache_key(row[1], row[2])
+                keys.add(key)
+                message = message_dict(row)
+                _cache_push(keys=[key, f"{key}:v"],
+                            args=[orjson.dumps(message), message["timestamp"],
+                                  message["message_id"], CACHE_MAX_MESSAGES,
+                                  version, CACHE_TTL],
+                            client=pipe)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning("[DB] Redis cache append failed: %s", e)
+        try:
+            _redis.delete(*keys, *(f"{key}:v" for key in keys))
+        except redis.RedisError:
+            logger.warning("[DB] Could not drop %d cached conversations", len(keys))
+
+
+def cache_invalidate(sender_id, receiver_id):
+    """Drop a conversation's cached list after an edit or delete"""
+    if _redis is None:
+        return
+    key = cache_key(sender_id, receiver_id)
+    try:
+        _redis.delete(key, f"{key}:v")
+    except redis.RedisError as e:
+        logger.warning("[DB] Redis cache invalidation failed: %s", e)
+
+
+def cache_fill(key, sender_id, receiver_id):
+    """Load a conversation's newest messages into Redis.
+
+    The version is read before the messages, so the list holds at least
+    everything up to it. The write is skipped if an append or
+    invalidation touches the version key while Postgres is being read.
+    """
+    try:
+        with _redis.pipeline() as pipe:
+            pipe.watch(f"{key}:v")
+            with db_cursor() as cursor:
+                cursor.execute("EXECUTE sel_version(%s, %s)", (sender_id, receiver_id))
+                version_row = cursor.fetchone()
+                cursor.execute("EXECUTE sel_recent(%s, %s, %s)",
+                               (sender_id, receiver_id, CACHE_MAX_MESSAGES))
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            pipe.multi()
+            pipe.delete(key)
+            pipe.rpush(key, *(orjson.dumps(message_dict(row))
+                              for row in reversed(rows)))
+            pipe.expire(key, CACHE_TTL)
+            pipe.set(f"{key}:v", version_row[0] if version_row else 0, ex=CACHE_TTL)
+            pipe.execute()
+    except redis.WatchError:
+        pass
+    except redis.RedisError as e:
+        logger.warning("[DB] Redis cache fill failed: %s", e)
+
+
+def conversation_version(sender_id, receiver_id):
+    """A conversation's version from conversation_versions, 0 if unset.
+
+    Every insert, edit and delete bumps it in its own transaction; the
+    fetch ETag is built from it.
+    """
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE sel_version(%s, %s)", (sender_id, receiver_id))
         row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+    return row[0] if row else 0
 
-        if not row:
-            print(f"[DB] ⚠️ User {user_id} not found")
-            return jsonify({"user_id": False, "password": False}), 200
 
-        password_match = row[0] == password
-        print(
-            f"[DB] ✅ Login check for {user_id}: password match = {password_match}")
-        return jsonify({"user_id": True, "password": password_match}), 200
+def read_cached_page(sender_id, receiver_id, page, version):
+    """Answer a cursor poll from the cache.
 
-    except Exception as e:
-        logging.exception("[DB] Error in login_user")
-        print(f"[DB] ❌ Error during login: {e}")
-        return jsonify({"error": "Internal Server Error"}), 500
+    Returns (messages, has_more, next cursor), or None when Postgres must
+    answer: no cursor, no cache, a cached list not yet complete up to
+    version (the batch writer updates Redis after its commit), or a
+    cached window that does not reach back over the overlap before the
+    cursor.
+    """
+    if _redis is None or page["after_ts"] is None:
+        return None
+
+    key = cache_key(sender_id, receiver_id)
+    cursor = (datetime.fromisoformat(page["after_ts"]), page["after_id"])
+    overlap_from = cursor[0] - timedelta(seconds=FETCH_OVERLAP_SECONDS)
+    unchanged = [], False, (page["after_ts"], page["after_id"])
+
+    def position(message):
+        return (datetime.fromisoformat(message["timestamp"]), message["message_id"])
+
+    def read_newest():
+        with _redis.pipeline() as pipe:
+            pipe.get(f"{key}:v")
+            pipe.lrange(key, -1, -1)
+            return pipe.execute()
+
+    try:
+        # Most polls find nothing new: check the newest message first
+        cached_version, newest = read_newest()
+        if not newest:
+            cache_fill(key, sender_id, receiver_id)
+            cached_version, newest = read_newest()
+            if not newest:
+                return None
+        if cached_version is None or int(cached_version) < version:
+            return None
+        if position(orjson.loads(newest[0]))[0] < overlap_from:
+            return unchanged
+
+        # The overlap (given as much room as the page), the page, one
+        # message past it to set has_more and one more from before the
+        # overlap to prove the window covers it
+        wanted = 2 * page["limit"] + 2
+        tail = [orjson.loads(item) for item in _redis.lrange(key, -wanted, -1)]
+    except redis.RedisError as e:
+        logger.warning("[DB] Redis cache read failed: %s", e)
+        return None
+    if not tail:
+        return None
+
+    # A list shorter than CACHE_MAX_MESSAGES was never trimmed, so it
+    # holds the whole conversation
+    whole = len(tail) < min(wanted, CACHE_MAX_MESSAGES)
+    if not whole and position(tail[0])[0] >= overlap_from:
+        return None
+    overlap = [message for message in tail
+               if overlap_from <= position(message)[0] and position(message) <= cursor]
+    newer = [message for message in tail if position(message) > cursor]
+    if not newer:
+        return overlap, False, unchanged[2]
+    page_messages = newer[:page["limit"]]
+    last = page_messages[-1]
+    return (overlap + page_messages, len(newer) > page["limit"],
+            (last["timestamp"], last["message_id"]))
+
+# ---------------- INSERT BATCHING (PostgreSQL) ----------------
+
+_insert_queue = queue.Queue(maxsize=INSERT_QUEUE_SIZE)
+_insert_worker = None
+_insert_worker_lock = threading.Lock()
+
+
+# Errors caused by a row's own values rather than the connection; a batch
+# that fails with one of these is retried row by row
+ROW_ERRORS = (ValueError, psycopg2.DataError, psycopg2.IntegrityError,
+              psycopg2.ProgrammingError)
+
+
+def insert_rows(rows):
+    """INSERT rows in one statement, bump and NOTIFY their conversations.
+
+    Returns the inserted rows in the order given, each paired with its
+    conversation's new version.
+    """
+    with db_cursor() as cursor:
+        # RETURNING yields rows in VALUES order
+        inserted = psycopg2.extras.execute_values(cursor, """
+            INSERT INTO messages (sender_id, receiver_id, message_text)
+            VALUES %s
+            RETURNING message_id, sender_id, receiver_id, message_text, timestamp, pair_key
+        """, rows, page_size=INSERT_BATCH_SIZE, fetch=True)
+        # Bump each conversation in key order, so concurrent batches lock
+        # the version rows in the same order; notifications are delivered
+        # to listeners when the batch commits
+        cursor.execute("""
+            WITH keys AS (
+                SELECT pair_key FROM unnest(%s) AS pair_key ORDER BY pair_key
+            ), bumped AS (""" + BUMP_VERSIONS_SQL.format(source="keys") + """
+                RETURNING pair_key, version
+            )
+            SELECT pair_key, version, pg_notify(%s, pair_key) FROM bumped
+        """, (sorted({row[5] for row in inserted}), NOTIFY_CHANNEL))
+        versions = {pair_key: version for pair_key, version, _ in cursor}
+    return [(row, versions[row[5]]) for row in inserted]
+
+
+def write_insert_batches():
+    """Drain queued messages and write each batch with a single INSERT"""
+    while True:
+        batch = [_insert_queue.get()]
+        deadline = time.monotonic() + INSERT_BATCH_WAIT
+        while len(batch) < INSERT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_insert_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        # Skip messages whose request already gave up waiting; the rest can
+        # no longer be cancelled
+        batch = [(row, future) for row, future in batch
+                 if future.set_running_or_notify_cancel()]
+        if not batch:
+            continue
+
+        try:
+            inserted = insert_rows([row for row, _ in batch])
+        except ROW_ERRORS as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                continue
+            # One bad row fails the whole INSERT: retry the batch row by
+            # row so only the bad rows fail
+            logger.warning("[DB] Insert batch failed, retrying rows: %s", e)
+            inserted = []
+            for row, future in batch:
+                try:
+                    (entry,) = insert_rows([row])
+                except Exception as row_error:
+                    future.set_exception(row_error)
+                else:
+                    inserted.append(entry)
+                    future.set_result(entry[0][0])
+            cache_append(inserted)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            cache_append(inserted)
+            for (_, future), (row, _) in zip(batch, inserted):
+                future.set_result(row[0])
+
+
+def queue_insert(sender_id, receiver_id, message_text):
+    """Queue one message for the batch writer and return a Future of its id.
+
+    Raises queue.Full when the writer is too far behind.
+    """
+    global _insert_worker
+    if _insert_worker is None:
+        with _insert_worker_lock:
+            if _insert_worker is None:
+                _insert_worker = threading.Thread(
+                    target=write_insert_batches, daemon=True)
+                _insert_worker.start()
+
+    future = Future()
+    _insert_queue.put_nowait(((sender_id, receiver_id, message_text), future))
+    return future
 
 # ---------------- INSERT MESSAGE (PostgreSQL) ----------------
 
 
 @app.route("/db/insert", methods=["POST"])
 def insert_message():
+    data = _body()
+    logger.debug("[DB] Attempting to insert new message")
+
+    error = validate_insert(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    future = queue_insert(
+        data["sender_id"], data["receiver_id"], data["message_text"])
     try:
-        data = request.get_json(force=True)
-        logging.info("[DB] Attempting to insert new message")
+        message_id = future.result(timeout=INSERT_TIMEOUT)
+    except ROW_ERRORS as e:
+        logger.warning("[DB] Message rejected: %s", e)
+        return jsonify({"error": "Message could not be stored"}), 400
+    except FutureTimeout:
+        # Still queued: drop it, so a retry cannot store it twice
+        if future.cancel():
+            logger.warning("[DB] Insert timed out in the queue, cancelled")
+            return jsonify({"error": "Message was not stored, try again"}), 503
+        # Already being written: it will be stored, so the client must not
+        # send it again
+        logger.warning("[DB] Insert timed out while being written")
+        return jsonify({"status": "accepted"}), 202
+
+    logger.debug("[DB] Message inserted successfully with ID: %s", message_id)
+    return jsonify({"message_id": message_id, "status": "success"}), 201
 
-        required_keys = {"sender_id", "receiver_id", "message_text"}
-        missing_keys = required_keys - data.keys()
-        if missing_keys:
-            return jsonify({"error": f"Missing fields: {', '.join(missing_keys)}"}), 400
+# ---------------- FETCH MESSAGES (PostgreSQL) ----------------
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO messages (sender_id, receiver_id, message_text)
-            VALUES (%s, %s, %s)
-            RETURNING message_id
-        """, (data["sender_id"], data["receiver_id"], data["message_text"]))
 
-        message_id = cursor.fetchone()[0]
-        conn.commit()
-        cursor.close()
-        conn.close()
+def page_response(messages, has_more, next_after_ts, next_after_id):
+    """Build the /db/fetch payload with the cursor for the next page"""
+    return jsonify({
+        "messages": messages,
+        "status": "success",
+        "has_more": has_more,
+        "next_after_ts": next_after_ts,
+        "next_after_id": next_after_id
+    })
 
-        print(f"✨ Message inserted successfully with ID: {message_id}")
-        return jsonify({"message_id": message_id, "status": "success"}), 201
 
-    except Exception as e:
-        logging.exception("[DB] Error in insert_message")
-        return jsonify({"error": "Internal Server Error"}), 500
+def read_page(sender_id, receiver_id, page, version):
+    """Answer a /db/fetch page from the cache or Postgres.
 
-# ---------------- FETCH MESSAGES (PostgreSQL) ----------------
+    version is the conversation version the page's ETag carries; the cache
+    only answers once it holds every message up to it.
+    """
+    if not page["after_ts"]:
+        with db_cursor() as cursor:
+            cursor.execute("EXECUTE sel_older(%s, %s, %s, %s, %s)", (
+                sender_id, receiver_id, page["before_ts"],
+                page["before_id"], page["limit"]))
 
+            payload = cursor.fetchone()[0]
 
-@app.route("/db/fetch", methods=["GET"])
-def fetch_messages():
-    try:
-        sender_id = request.args.get("sender_id")
-        receiver_id = request.args.get("receiver_id")
-        if not sender_id or not receiver_id:
-            return jsonify({"error": "sender_id and receiver_id are required"}), 400
+        return app.response_class(payload, 200, mimetype="application/json")
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT message_id, sender_id, receiver_id, message_text, timestamp
-            FROM messages
-            WHERE (sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY timestamp ASC
-        """, (sender_id, receiver_id, receiver_id, sender_id))
-
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        messages = [
-            {
-                "message_id": row[0],
-                "sender_id": row[1],
-                "receiver_id": row[2],
-                "message_text": row[3],
-                "timestamp": row[4].isoformat() if hasattr(row[4], 'isoformat') else row[4]
-            }
-            for row in rows
-        ]
-
-        print(f"📬 Found {len(messages)} messages")
-        return jsonify({"messages": messages, "status": "success"}), 200
+    cached = read_cached_page(sender_id, receiver_id, page, version)
+    if cached is not None:
+        messages, has_more, (next_after_ts, next_after_id) = cached
+        logger.debug("[DB] Found %d cached messages", len(messages))
+        return page_response(messages, has_more, next_after_ts, next_after_id)
 
-    except Exception as e:
-        logging.exception("[DB] Error in fetch_messages")
-        return jsonify({"error": "Internal Server Error"}), 500
+    # Keyset pagination: one index range scan starting after the cursor;
+    # Postgres returns the finished JSON body
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE sel_msgs(%s, %s, %s, %s, %s, %s)", (
+            sender_id, receiver_id, page["after_ts"], page["after_id"],
+            page["limit"], FETCH_OVERLAP_SECONDS))
+
+        payload = cursor.fetchone()[0]
+
+    return app.response_class(payload, 200, mimetype="application/json")
+
+
+@app.route("/db/fetch", methods=["GET"])
+def fetch_messages():
+    sender_id = request.args.get("sender_id")
+    receiver_id = request.args.get("receiver_id")
+    if not sender_id or not receiver_id:
+        return jsonify({"error": "sender_id and receiver_id are required"}), 400
+
+    page, error = parse_page_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # A poll repeating the ETag of an unchanged conversation gets an empty
+    # 304 after one primary-key lookup, without reading a page. The version
+    # is read first, so the page holds at least what its tag promises.
+    version = conversation_version(sender_id, receiver_id)
+    etag = f'W/"{version}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = app.response_class(status=304)
+    else:
+        response = read_page(sender_id, receiver_id, page, version)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 # ---------------- UPDATE MESSAGE (PostgreSQL) ----------------
 
 
 @app.route("/db/update", methods=["PUT"])
 def update_message():
-    try:
-        data = request.get_json(force=True)
-        parsed, error = parse_request_data(
-            data, {"message_id", "sender_id", "message_text"})
-        if error:
-            return jsonify({"error": error}), 400
-
-        message_id = parsed["message_id"]
-        sender_id = parsed["sender_id"]
-        new_text = parsed["message_text"]
-        print(
-            f"[DB] ✏️ Attempting to update message {message_id} from sender {sender_id}")
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE messages
-            SET message_text = %s
-            WHERE message_id = %s AND sender_id = %s
-        """, (new_text, message_id, sender_id))
-
-        if cursor.rowcount == 0:
-            print(f"[DB] ⚠️ Message {message_id} not found or sender mismatch")
-            cursor.close()
-            conn.close()
-            return jsonify({"error": "Message not found or sender mismatch"}), 404
+    data = _body()
+    error = validate_update(data)
+    if error:
+        return jsonify({"error": error}), 400
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+    message_id = data["message_id"]
+    sender_id = data["sender_id"]
+    new_text = data["message_text"]
+    logger.debug("[DB] Attempting to update message %s from sender %s",
+                 message_id, sender_id)
 
-        print(f"[DB] ✅ Successfully updated message {message_id}")
-        return jsonify({"status": "success", "updated_id": message_id}), 200
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE upd_msg(%s, %s, %s)",
+                       (new_text, message_id, sender_id))
 
-    except Exception as e:
-        logging.exception("[DB] Error updating message")
-        print(f"[DB] ❌ Error updating message: {e}")
-        return jsonify({"error": "Internal Server Error"}), 500
+        row = cursor.fetchone()
+        if row is None:
+            logger.debug("[DB] Message %s not found or sender mismatch", message_id)
+            return jsonify({"error": "Message not found or sender mismatch"}), 404
+
+    cache_invalidate(*row)
+
+    logger.debug("[DB] Successfully updated message %s", message_id)
+    return jsonify({"status": "success", "updated_id": message_id}), 200
 
 # ---------------- DELETE MESSAGE (PostgreSQL) ----------------
 
 
 @app.route("/db/delete", methods=["DELETE"])
 def delete_message():
-    try:
-        data = request.get_json(force=True)
-        parsed, error = parse_request_data(data, {"message_id", "sender_id"})
-        if error:
-            return jsonify({"error": error}), 400
-
-        message_id = parsed["message_id"]
-        sender_id = parsed["sender_id"]
-        print(
-            f"[DB] 🗑️ Attempting to delete message {message_id} from sender {sender_id}")
-
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            DELETE FROM messages
-            WHERE message_id = %s AND sender_id = %s
-        """, (message_id, sender_id))
-
-        if cursor.rowcount == 0:
-            print(f"[DB] ⚠️ Message {message_id} not found or sender mismatch")
-            cursor.close()
-            conn.close()
+    data = _body()
+    error = validate_delete(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    message_id = data["message_id"]
+    sender_id = data["sender_id"]
+    logger.debug("[DB] Attempting to delete message %s from sender %s",
+                 message_id, sender_id)
+
+    with db_cursor() as cursor:
+        cursor.execute("EXECUTE del_msg(%s, %s)",
+                       (message_id, sender_id))
+
+        row = cursor.fetchone()
+        if row is None:
+            logger.debug("[DB] Message %s not found or sender mismatch", message_id)
             return jsonify({"error": "Message not found or sender mismatch"}), 404
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+    cache_invalidate(*row)
 
-        print(f"[DB] ✅ Successfully deleted message {message_id}")
-        return jsonify({"status": "success", "deleted_id": message_id}), 200
+    logger.debug("[DB] Successfully deleted message %s", message_id)
+    return jsonify({"status": "success", "deleted_id": message_id}), 200
+
+# ---------------- NEW MESSAGE STREAM (LISTEN/NOTIFY) ----------------
+
+# pair_key -> wake-up queues of the streams open on that conversation
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def wake_streams(keys=None):
+    """Wake the open streams for the given pair keys (all streams if None)"""
+    with _subscribers_lock:
+        if keys is None:
+            waiting = [q for queues in _subscribers.values() for q in queues]
+        else:
+            waiting = [q for key in keys for q in _subscribers.get(key, ())]
+    for wakeup in waiting:
+        try:
+            wakeup.put_nowait(None)
+        except queue.Full:
+            pass  # A wake-up is already pending
 
-    except Exception as e:
-        logging.exception("[DB] Error deleting message")
-        print(f"[DB] ❌ Error deleting message: {e}")
-        return jsonify({"error": "Internal Server Error"}), 500
+
+def listen_for_messages():
+    """Hold one LISTEN connection per process and fan notifications out.
+
+    After (re)connecting every stream is woken once, since anything
+    inserted while disconnected was never announced.
+    """
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(get_database_url(), sslmode='require',
+                                    keepalives=1, keepalives_idle=30)
+            conn.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            wake_streams()
+
+            while True:
+                if select.select([conn], [], [], STREAM_HEARTBEAT)[0]:
+                    conn.poll()
+                    keys = {notify.payload for notify in conn.notifies}
+                    conn.notifies.clear()
+                    wake_streams(keys)
+        except Exception as e:
+            logger.warning("[DB] LISTEN connection lost: %s", e)
+            time.sleep(1)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def subscribe(key):
+    """Register a stream for a conversation and return its wake-up queue"""
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = threading.Thread(
+                    target=listen_for_messages, daemon=True)
+                _listener.start()
+
+    wakeup = queue.Queue(maxsize=1)
+    with _subscribers_lock:
+        _subscribers.setdefault(key, set()).add(wakeup)
+    return wakeup
+
+
+def unsubscribe(key, wakeup):
+    with _subscribers_lock:
+        queues = _subscribers.get(key)
+        if queues is not None:
+            queues.discard(wakeup)
+            if not queues:
+                del _subscribers[key]
+
+
+@app.route("/db/stream", methods=["GET"])
+def stream_messages():
+    """Server-sent events: one 'data' event whenever the conversation gets
+    new messages, which the client follows with a cursor fetch.
+    """
+    sender_id = request.args.get("sender_id")
+    receiver_id = request.args.get("receiver_id")
+    if not sender_id or not receiver_id:
+        return jsonify({"error": "sender_id and receiver_id are required"}), 400
+
+    with db_cursor() as cursor:
+        cursor.execute("SELECT " + pair_key_sql("%(a)s", "%(b)s"),
+                       {"a": sender_id, "b": receiver_id})
+        key = cursor.fetchone()[0]
+
+    wakeup = subscribe(key)
+
+    def events():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    wakeup.get(timeout=STREAM_HEARTBEAT)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                else:
+                    yield "data: new_messages\n\n"
+        finally:
+            unsubscribe(key, wakeup)
+
+    return app.response_class(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 # ---------------- DATABASE HEALTH CHECK ----------------
 
 
+# Server version, read once on the first /db/test-connection
+_server_version = None
+
+
+def estimated_message_count(cursor):
+    """Planner's row estimate for messages: a catalog lookup, not a scan.
+
+    reltuples is -1 until the table has been vacuumed or analyzed.
+    """
+    cursor.execute("""
+        SELECT GREATEST(reltuples, 0)::bigint
+        FROM pg_class WHERE oid = 'messages'::regclass
+    """)
+    return cursor.fetchone()[0]
+
+
 @app.route("/db/health", methods=["GET"])
 def db_health_check():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        count = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
+        # Probed constantly by the load balancer and the frontend, so
+        # this must stay O(1) however large the table grows
+        with db_cursor() as cursor:
+            count = estimated_message_count(cursor)
         return jsonify({"status": "healthy", "service": "Database Server", "message_count": count}), 200
     except Exception as e:
         return jsonify({"status": "unhealthy", "service": "Database Server", "error": str(e)}), 500
@@ -363,24 +1223,19 @@ def db_health_check():
 
 @app.route("/db/test-connection", methods=["GET"])
 def test_connection():
+    global _server_version
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Test a simple query
-        cursor.execute("SELECT version()")
-        version = cursor.fetchone()[0]
+        with db_cursor() as cursor:
+            if _server_version is None:
+                cursor.execute("SELECT version()")
+                _server_version = cursor.fetchone()[0]
 
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        count = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
+            count = estimated_message_count(cursor)
 
         return jsonify({
             "status": "success",
             "database": "PostgreSQL",
-            "version": version,
+            "version": _server_version,
             "message_count": count
         }), 200
 
@@ -390,10 +1245,3 @@ def test_connection():
             "database": "SQLite (fallback)",
             "error": str(e)
         }), 500
-
-
-if __name__ == "__main__":
-    print("Starting Database Server on port 5002...")
-    init_database()
-    port = int(os.environ.get('PORT', 5002))
-    app.run(debug=True, host='0.0.0.0', port=port, use_reloader=False)
@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Run with: gunicorn wsgi:app (this file is picked up automatically).
+# This is also how to run it locally; there is no dev-server entry point.
+bind = f"0.0.0.0:{os.environ.get('PORT', 5002)}"
+worker_class = "gevent"
+workers = int(os.environ.get("WEB_CONCURRENCY",
+                             multiprocessing.cpu_count() * 2 + 1))
+worker_connections = 2000
+
+
+def on_starting(server):
+    """Create and migrate the tables once, before any worker starts.
+
+    Runs in a child process: the master must not import db_server, which
+    the workers may only import after wsgi.py's gevent monkey-patching.
+    """
+    subprocess.run(
+        [sys.executable, "-c", "from db_server import init_database; init_database()"],
+        cwd=os.path.dirname(os.path.abspath(__file__)))
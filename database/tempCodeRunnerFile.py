@@ -1 +0,0 @@
-update
\ No newline at end of file
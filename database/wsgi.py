@@ -0,0 +1,12 @@
+# Patch blocking I/O before anything else imports socket/ssl/threading so
+# every request runs in its own greenlet.
+from gevent import monkey
+monkey.patch_all()
+
+# psycopg2 is a C extension; make its sockets yield to the gevent hub too.
+from psycogreen.gevent import patch_psycopg
+patch_psycopg()
+
+# Tables are set up once per deploy by gunicorn.conf.py's on_starting hook,
+# not here in every worker.
+from db_server import app  # noqa: E402,F401